@@ -8,24 +8,268 @@ This module will manage a dataset in Redis with a tree structure
   bar = foo.FunctionBar()
 """
 import logging
+import re
 import uuid
+from itertools import chain, islice
+from typing import Optional
+
 import redis
-from redis import WatchError
+
+# In all scripts ARGV[1] is the key prefix of the dataset, prepended to the keys the scripts build themselves.
+
+# Save the entity hash KEYS[1] with its indexes, the parent pointer KEYS[2] and add it to the child set KEYS[3].
+# ARGV holds the key prefix, the uuid, the parent uuid and then the property/value pairs of the entity.
+LUA_CREATE = """
+local index_prefix = ARGV[1] .. 'i:'
+local entity_uuid = ARGV[2]
+for i = 4, #ARGV, 2 do
+    redis.call('HSET', KEYS[1], ARGV[i], ARGV[i + 1])
+    redis.call('SADD', index_prefix .. ARGV[i] .. ':' .. ARGV[i + 1], entity_uuid)
+end
+redis.call('SET', KEYS[2], ARGV[3])
+redis.call('SADD', KEYS[3], entity_uuid)
+"""
+
+# Delete the entity hash KEYS[1] with its indexes, its parent pointer KEYS[2] and its child set KEYS[3], and unlink
+# the entity (uuid ARGV[2]) from its parent.
+LUA_DELETE = """
+local entity_uuid = ARGV[2]
+local fields = redis.call('HGETALL', KEYS[1])
+for i = 1, #fields, 2 do
+    redis.call('SREM', ARGV[1] .. 'i:' .. fields[i] .. ':' .. fields[i + 1], entity_uuid)
+end
+local parent_uuid = redis.call('GET', KEYS[2])
+if parent_uuid then
+    redis.call('SREM', ARGV[1] .. 'c:' .. parent_uuid, entity_uuid)
+end
+redis.call('DEL', KEYS[1], KEYS[2], KEYS[3])
+"""
+
+# Find the entities in all filter sets KEYS and in the union of the index sets matching each pattern. ARGV holds the
+# key prefix, the number of patterns, the patterns and then the properties to read (HMGET), the whole hash (HGETALL)
+# is read when none are given. The hits are returned as a flat list of uuid, field/value list pairs. The unions are
+# kept in Lua tables, the script only reads.
+LUA_FIND = """
+local pattern_cnt = tonumber(ARGV[2])
+local fields = {}
+for i = 3 + pattern_cnt, #ARGV do
+    fields[#fields + 1] = ARGV[i]
+end
+
+local function get_fields(entity_key)
+    if #fields == 0 then
+        return redis.call('HGETALL', entity_key)
+    end
+    -- Read in chunks to stay below the stack limit of unpack
+    local values = {}
+    for i = 1, #fields, 1000 do
+        local chunk = redis.call('HMGET', entity_key, unpack(fields, i, math.min(i + 999, #fields)))
+        for j = 1, #chunk do
+            values[i + j - 1] = chunk[j]
+        end
+    end
+    local entity = {}
+    for i, field in ipairs(fields) do
+        if values[i] then
+            entity[#entity + 1] = field
+            entity[#entity + 1] = values[i]
+        end
+    end
+    return entity
+end
+
+-- The members of all index sets whose key matches the pattern as a set table and their count, the sets are read
+-- with SUNION in chunks to stay below the stack limit of unpack
+local function union_matching(pattern)
+    local cursor = '0'
+    local matching_keys = {}
+    repeat
+        local reply = redis.call('SCAN', cursor, 'MATCH', pattern, 'COUNT', 1000)
+        cursor = reply[1]
+        for _, key in ipairs(reply[2]) do
+            matching_keys[#matching_keys + 1] = key
+        end
+    until cursor == '0'
+    local union = {}
+    local union_cnt = 0
+    for i = 1, #matching_keys, 1000 do
+        local members = redis.call('SUNION', unpack(matching_keys, i, math.min(i + 999, #matching_keys)))
+        for _, member in ipairs(members) do
+            if not union[member] then
+                union[member] = true
+                union_cnt = union_cnt + 1
+            end
+        end
+    end
+    return union, union_cnt
+end
+
+-- A missing filter set means no hits, checked before scanning for the patterns
+if #KEYS > 0 and redis.call('EXISTS', unpack(KEYS)) < #KEYS then
+    return {}
+end
+local unions = {}
+local smallest = 1
+local smallest_cnt = nil
+for i = 1, pattern_cnt do
+    local union, union_cnt = union_matching(ARGV[2 + i])
+    if union_cnt == 0 then
+        return {}
+    end
+    unions[i] = union
+    if smallest_cnt == nil or union_cnt < smallest_cnt then
+        smallest = i
+        smallest_cnt = union_cnt
+    end
+end
+
+-- The candidates come from the intersection of the filter sets, or without them from the smallest union, and are
+-- checked against the (other) unions
+local candidates
+if #KEYS > 0 then
+    candidates = redis.call('SINTER', unpack(KEYS))
+    smallest = nil
+else
+    candidates = {}
+    for member in pairs(unions[smallest]) do
+        candidates[#candidates + 1] = member
+    end
+end
+
+local result = {}
+for _, entity_uuid in ipairs(candidates) do
+    local hit = true
+    for i = 1, pattern_cnt do
+        if i ~= smallest and not unions[i][entity_uuid] then
+            hit = false
+            break
+        end
+    end
+    if hit then
+        result[#result + 1] = entity_uuid
+        result[#result + 1] = get_fields(ARGV[1] .. 'e:' .. entity_uuid)
+    end
+end
+return result
+"""
+
+# Apply a change to the entity hash KEYS[1] and its indexes. ARGV holds the key prefix, the uuid, the number of
+# removed properties, the names of the removed properties and then the property/value pairs to set.
+LUA_APPLY = """
+local entity_key = KEYS[1]
+local index_prefix = ARGV[1] .. 'i:'
+local entity_uuid = ARGV[2]
+local removed_cnt = tonumber(ARGV[3])
+local old_entity = {}
+local fields = redis.call('HGETALL', entity_key)
+for i = 1, #fields, 2 do
+    old_entity[fields[i]] = fields[i + 1]
+end
+local removed_fields = {}
+for i = 4, 3 + removed_cnt do
+    local key = ARGV[i]
+    local old_value = old_entity[key]
+    if old_value then
+        redis.call('SREM', index_prefix .. key .. ':' .. old_value, entity_uuid)
+        removed_fields[#removed_fields + 1] = key
+    end
+end
+local updated_fields = {}
+for i = 4 + removed_cnt, #ARGV, 2 do
+    local key = ARGV[i]
+    local value = ARGV[i + 1]
+    local old_value = old_entity[key]
+    if old_value then
+        redis.call('SREM', index_prefix .. key .. ':' .. old_value, entity_uuid)
+    end
+    updated_fields[#updated_fields + 1] = key
+    updated_fields[#updated_fields + 1] = value
+    redis.call('SADD', index_prefix .. key .. ':' .. value, entity_uuid)
+end
+-- Written in chunks to stay below the stack limit of unpack
+for i = 1, #removed_fields, 1000 do
+    redis.call('HDEL', entity_key, unpack(removed_fields, i, math.min(i + 999, #removed_fields)))
+end
+for i = 1, #updated_fields, 1000 do
+    redis.call('HSET', entity_key, unpack(updated_fields, i, math.min(i + 999, #updated_fields)))
+end
+"""
+
+
+# Connection pools shared by all Model instances, per server (host, port)
+_pools: dict[tuple[str, int], redis.BlockingConnectionPool] = {}
+# The registered Lua scripts, loaded once per server (host, port)
+_scripts: dict[tuple[str, int], list] = {}
+
+
+def _get_pool(host: str, port: int) -> redis.BlockingConnectionPool:
+    pool = _pools.get((host, port))
+    if pool is None:
+        # Callers wait for a free connection instead of opening an unbounded number of them
+        pool = _pools.setdefault((host, port), redis.BlockingConnectionPool(host=host, port=port, db=0,
+                                                                            max_connections=32))
+    return pool
+
+
+def _decode(fields: dict[bytes, bytes]) -> dict[str, str]:
+    # Replies are kept as bytes internally and only decoded where entities are handed to the caller
+    return {key.decode(): value.decode() for key, value in fields.items()}
 
 
 class Model:
     logger = logging.getLogger(__name__)
-    _redisClient: redis.client = redis.Redis('localhost', port=6379, db=0, encoding='utf-8', decode_responses=True)
+    # Upper bound on the number of HGETALL commands queued in one pipeline
+    _batch_size: int = 500
+
+    def __init__(self, host: str, port: int = 6379, key_prefix: str = ''):
+        """Connect the model to a Redis server.
+
+         Args:
+             host: The host name of the Redis server.
+             port: The port of the Redis server.
+             key_prefix: Prepended to every key of the model, so several datasets (e.g. one per test) can share a
+              database without seeing each other.
+         """
+        self._key_prefix = key_prefix
+        # Glob characters in the prefix are escaped where it is part of a SCAN pattern
+        self._pattern_prefix = re.sub(r'([*?\[\]\\])', r'\\\1', key_prefix)
+        server = (host, port)
+        self._redisClient = redis.Redis(connection_pool=_get_pool(*server))
+        scripts = _scripts.get(server)
+        if scripts is None:
+            scripts = _scripts.setdefault(server, self._load_scripts(LUA_CREATE, LUA_DELETE, LUA_FIND, LUA_APPLY))
+        self._create_script, self._delete_script, self._find_script, self._apply_script = scripts
+
+    def _load_scripts(self, *scripts: str) -> list:
+        """Register the Lua scripts and load them on the server in a single round-trip.
 
-    def __init__(self, host: str):
-        _redisClient = redis.Redis(host, port=6379, db=0, encoding='utf-8', decode_responses=True)
+         With the scripts loaded up front the first call of each is a plain EVALSHA. A script that goes missing
+         later on (e.g. after a SCRIPT FLUSH) is reloaded on demand by the registered Script object.
+
+         Args:
+             scripts: The Lua source of the scripts.
+         """
+        with self._redisClient.pipeline(transaction=False) as pipe:
+            for script in scripts:
+                pipe.script_load(script)
+            pipe.execute()
+        return [self._redisClient.register_script(script) for script in scripts]
 
     def flush_all(self):
-        self._redisClient.flushall()
+        """Delete all data, or only the keys of this model when it was created with a key prefix."""
+        if not self._key_prefix:
+            self._redisClient.flushall()
+            return
+        keys = self._redisClient.scan_iter(match=f'{self._pattern_prefix}*', count=1000)
+        while True:
+            batch = list(islice(keys, 1000))
+            if not batch:
+                return
+            self._redisClient.delete(*batch)
 
     @staticmethod
     def init(entity: dict[str, str]) -> dict[str, str]:
-        entity.__setitem__('uuid', str(uuid.uuid4()))
+        entity['uuid'] = uuid.uuid4().hex
         return entity
 
     def create(self, parent_uuid: str, entity: dict[str, str]) -> dict[str, str]:
@@ -40,24 +284,68 @@ class Model:
          Raises:
              TypeError: An error occurred accessing the uuid of the entity.
          """
-        with self._redisClient.pipeline() as pipe:
-            pipe.multi()
-            entity_uuid = entity['uuid']
-            if entity_uuid is None:
+        # The entity, its indexes and the parent links are written atomically server side in one round-trip
+        keys, args = self._create_call(parent_uuid, entity)
+        self._create_script(keys=keys, args=args)
+        return entity
+
+    def create_many(self, parent_uuid: str, entities: list[dict[str, str]],
+                    chunk_size: int = 1000) -> list[dict[str, str]]:
+        """Create and save a batch of new entities under the same parent.
+
+         The writes for up to chunk_size entities are sent in a single pipeline, so a bulk load costs one
+         round-trip per chunk instead of one per entity. Unlike create, a chunk is not applied atomically.
+
+         Args:
+             parent_uuid: The uuid of the parent of the entities.
+             entities: A list of dictionaries that contain the properties of each entity
+             chunk_size: The maximum number of entities written per pipeline.
+
+         Raises:
+             TypeError: An entity without uuid was found, nothing has been written.
+         """
+        for entity in entities:
+            if entity.get('uuid') is None:
                 raise TypeError('entity must be a dictionary (dict) containing the key \'uuid\'')
-            # Save the entity without the uuid value (temporary removed)
-            del entity['uuid']
-            pipe.hset('e:' + entity_uuid, mapping=entity)
-            for key, value in entity.items():
-                pipe.sadd('i:' + key + ':' + value, entity_uuid)
-            entity['uuid'] = entity_uuid
-            # Save the parent pointer
-            pipe.set('p:' + entity_uuid, parent_uuid)
-            # Reinstate the uuid value in the entity
-            # Add this entity into the child list of the parent
-            pipe.sadd('c:' + parent_uuid, entity_uuid)
+        for start in range(0, len(entities), chunk_size):
+            self._run_pipelined(self._create_script, [self._create_call(parent_uuid, entity)
+                                                      for entity in entities[start:start + chunk_size]])
+        return entities
+
+    def _create_call(self, parent_uuid: str, entity: dict[str, str]) -> tuple[list, list]:
+        # The keys and arguments of the create script for the entity
+        entity_uuid = entity['uuid']
+        if entity_uuid is None:
+            raise TypeError('entity must be a dictionary (dict) containing the key \'uuid\'')
+        # Save the entity without the uuid value, the caller's dictionary is left untouched
+        properties = chain.from_iterable((key, value) for key, value in entity.items() if key != 'uuid')
+        prefix = self._key_prefix
+        return ([f'{prefix}e:{entity_uuid}', f'{prefix}p:{entity_uuid}', f'{prefix}c:{parent_uuid}'],
+                [prefix, entity_uuid, parent_uuid, *properties])
+
+    def _run_pipelined(self, script, calls: list[tuple[list, list]]):
+        """Run a script once for each call in a single pipeline round-trip.
+
+         The calls are queued as plain EVALSHA, a registered Script on a pipeline would first check for the script
+         with SCRIPT EXISTS in a round-trip of its own. Should the script have gone missing from the server since it
+         was loaded (e.g. after a SCRIPT FLUSH), it is loaded again and the calls are sent once more. That is safe
+         since running the create and delete scripts again has no further effect.
+
+         Args:
+             script: The registered script to run.
+             calls: The keys and arguments of each run.
+         """
+        try:
+            self._evalsha_pipelined(script, calls)
+        except redis.exceptions.NoScriptError:
+            script.sha = self._redisClient.script_load(script.script)
+            self._evalsha_pipelined(script, calls)
+
+    def _evalsha_pipelined(self, script, calls: list[tuple[list, list]]):
+        with self._redisClient.pipeline(transaction=False) as pipe:
+            for keys, args in calls:
+                pipe.evalsha(script.sha, len(keys), *keys, *args)
             pipe.execute()
-            return entity
 
     ##
     # Retrieve the entity for the given uuid
@@ -66,10 +354,10 @@ class Model:
     # @return The entity in form of a @dict
 
     def get(self, entity_uuid: str):
-        entity_key = 'e:' + entity_uuid
-        entity: dict = self._redisClient.hgetall(entity_key)
+        entity_key = f'{self._key_prefix}e:{entity_uuid}'
+        entity: dict = _decode(self._redisClient.hgetall(entity_key))
         entity['uuid'] = entity_uuid
-        print('Get:' + str(entity))
+        self.logger.debug('Get:%s', entity)
         return entity
 
     ##
@@ -79,135 +367,158 @@ class Model:
 
     def apply(self, change: dict[str, str]):
         entity_uuid: str = change['uuid']
-        watch_key = 'w:' + entity_uuid
-        entity_key = 'e:' + entity_uuid
-        with self._redisClient.pipeline() as pipe:
-            while True:
-                try:
-                    # put a WATCH on the entity key (with a prefix because hash keys are not watchable)
-                    pipe.watch(watch_key)
-                    old_entity = pipe.hgetall(entity_key)
-                    print(old_entity)
-                    # now we can put the pipeline back into buffered mode with MULTI
-                    pipe.multi()
-                    pipe.set(watch_key, '')
-
-                    updated_values: dict = dict(filter(lambda elem: elem[1] is not None and elem[0] != 'uuid', change.items()))
-                    print(updated_values)
-                    for key, value in change.items():
-                        if value is None:
-                            old_value = old_entity[key]
-                            pipe.hdel(entity_key, key)
-                            pipe.srem('i:' + key + ":" + old_value, entity_uuid)
-
-                    if len(updated_values) > 0:
-                        pipe.hset(entity_key, mapping=updated_values)
-                        for key, value in updated_values.items():
-                            if key in old_entity:
-                                old_value = old_entity[key]
-                                if old_value is not None:
-                                    pipe.srem('i:' + key + ':' + old_value, entity_uuid)
-                            pipe.sadd('i:' + key + ':' + value, entity_uuid)
-
-                    # and finally, execute the pipeline (the set command)
-                    pipe.execute()
-                    break
-                except WatchError:
-                    # another client must have changed the entity between
-                    # the time we started WATCHing it and the pipeline's execution.
-                    # our best bet is to just retry.
-                    continue
+        entity_key = f'{self._key_prefix}e:{entity_uuid}'
+        removed_fields = []
+        updated_values = []
+        for key, value in change.items():
+            if key == 'uuid':
+                continue
+            if value is None:
+                removed_fields.append(key)
+            else:
+                updated_values += (key, value)
+        # The read of the current entity, the diff and the writes run atomically server side in one round-trip
+        self._apply_script(keys=[entity_key],
+                           args=[self._key_prefix, entity_uuid, len(removed_fields), *removed_fields,
+                                 *updated_values])
 
     def delete(self, entity: dict[str, str]):
-        entity_uuid: str = entity['uuid']
-        with self._redisClient.pipeline() as pipe:
-            while True:
-                try:
-                    # put a WATCH on the entity key (with a prefix because hash keys are not watchable)
-                    pipe.watch('w:' + entity_uuid)
-                    old_entity = pipe.hgetall('e:' + entity_uuid)
-                    parent_uuid: str = pipe.get('p:' + entity_uuid)
-                    print('Current entity:')
-                    print(old_entity)
-                    print('Parent:' + str(parent_uuid))
-                    # now we can put the pipeline back into buffered mode with MULTI
-                    pipe.multi()
-                    pipe.set('w:' + entity_uuid, '')
-                    for key, value in old_entity.items():
-                        old_value = old_entity[key]
-                        pipe.hdel('e:' + entity_uuid, key)
-                        pipe.srem('i:' + key + ":" + old_value, entity_uuid)
-                        print('Delete:' + str(key))
-
-                    pipe.hdel('e:' + entity_uuid, '*')
-                    print('Delete:' + entity_uuid)
-                    # and finally, execute the pipeline (the set command)
-                    pipe.delete('w:' + entity_uuid)
-                    pipe.delete('p:' + entity_uuid)
-                    pipe.srem('c:' + entity_uuid, '*')
-                    # Unlink this entity from the parent
-                    pipe.srem('c:' + parent_uuid, entity_uuid)
-                    pipe.execute()
-                    print('Update executed, version')
-                    break
-                except WatchError:
-                    # another client must have changed the entity between
-                    # the time we started WATCHing it and the pipeline's execution.
-                    # our best bet is to just retry.
-                    continue
-
-    def get_entity_from_index(self, index_hit: str):
-        print('Index lookup:' + index_hit)
-        print('Index hit:' + str(self._redisClient.smembers(index_hit)))
-        for entity_uuid in self._redisClient.smembers(index_hit):
-            entity_key = 'e:' + entity_uuid
-            entity: dict = self._redisClient.hgetall(entity_key)
-            entity['uuid'] = entity_uuid
-            yield entity
+        # The entity, its indexes and the parent links are removed atomically server side in one round-trip
+        keys, args = self._delete_call(entity['uuid'])
+        self._delete_script(keys=keys, args=args)
+
+    def delete_many(self, entities: list[dict[str, str]], chunk_size: int = 1000):
+        """Delete a batch of entities.
+
+         Each entity is removed atomically, together with its index entries, parent pointer and child set, and
+         unlinked from its parent. The deletes for up to chunk_size entities are sent in a single pipeline.
+
+         Args:
+             entities: A list of dictionaries that contain at least the uuid of each entity
+             chunk_size: The maximum number of entities deleted per pipeline.
+         """
+        entity_uuids = [entity['uuid'] for entity in entities]
+        for start in range(0, len(entity_uuids), chunk_size):
+            self._run_pipelined(self._delete_script, [self._delete_call(entity_uuid)
+                                                      for entity_uuid in entity_uuids[start:start + chunk_size]])
+
+    def _delete_call(self, entity_uuid: str) -> tuple[list, list]:
+        # The keys and arguments of the delete script for the entity
+        prefix = self._key_prefix
+        return ([f'{prefix}e:{entity_uuid}', f'{prefix}p:{entity_uuid}', f'{prefix}c:{entity_uuid}'],
+                [prefix, entity_uuid])
+
+    def _get_entities(self, entity_uuids, fields: Optional[list[str]] = None):
+        """Retrieve the entities for the given uuids.
+
+         The HGETALL (or HMGET) for each entity is pipelined in batches of _batch_size, so a result set costs one
+         round-trip per batch instead of one per entity.
 
-    def find(self, *args, **kwargs):
+         Args:
+             entity_uuids: An iterable with the uuids (bytes) of the entities to get.
+             fields: The properties to read, all of them when None. Properties the entity lacks are left out.
+         """
+        entity_prefix = f'{self._key_prefix}e:'.encode()
+        entity_uuids = iter(entity_uuids)
+        while True:
+            batch = list(islice(entity_uuids, self._batch_size))
+            if not batch:
+                return
+            with self._redisClient.pipeline(transaction=False) as pipe:
+                for entity_uuid in batch:
+                    if fields:
+                        pipe.hmget(entity_prefix + entity_uuid, fields)
+                    else:
+                        pipe.hgetall(entity_prefix + entity_uuid)
+                replies = pipe.execute()
+            for entity_uuid, reply in zip(batch, replies):
+                if fields:
+                    entity: dict = {field: value.decode() for field, value in zip(fields, reply) if value is not None}
+                else:
+                    entity = _decode(reply)
+                entity['uuid'] = entity_uuid.decode()
+                yield entity
+
+    def _scan_members(self, key: str):
+        # The set is streamed with SSCAN, so only about one batch of members is held at a time. SSCAN can return a
+        # member twice when the set is rehashed during the iteration, a caller that needs unique hits dedupes by uuid
+        return self._redisClient.sscan_iter(key, count=self._batch_size)
+
+    def get_entity_from_index(self, index_hit: str, fields: Optional[list[str]] = None):
+        self.logger.debug('Index lookup:%s', index_hit)
+        yield from self._get_entities(self._scan_members(f'{self._key_prefix}{index_hit}'), fields)
+
+    @staticmethod
+    def _is_pattern(value: str) -> bool:
+        return '*' in value or '?' in value or '[' in value
+
+    def find(self, *args, fields: Optional[list[str]] = None, **kwargs):
+        if len(kwargs) == 1:
+            # Single criterion lookups that do not need an intersection
+            if 'parent' in kwargs:
+                yield from self.get_children(kwargs['parent'], fields)
+                return
+            if 'uuid' in kwargs and not self._is_pattern(kwargs['uuid']):
+                entity_uuid = kwargs['uuid']
+                reply = self._redisClient.hgetall(f'{self._key_prefix}e:{entity_uuid}')
+                if len(reply) > 0:
+                    found: dict = _decode(reply)
+                    if fields:
+                        # A single hash is read whole and projected here, saving the separate existence check
+                        found = {field: found[field] for field in fields if field in found}
+                    found['uuid'] = entity_uuid
+                    yield found
+                return
+
+        prefix = self._key_prefix
         filter_list = []
+        patterns = []
         for key in kwargs.keys():
             value = kwargs.get(key)
             if key == 'parent':
-                filter_list.append('c:' + value)
-            elif '*' in value or '?' in value or '[' in value:
-                matching_keys = list(self._redisClient.scan_iter('i:' + key + ':' + value, count=1000))
-                if len(matching_keys) > 0:
-                    matching_key_set_name = 'u:' + str(uuid.uuid4())
-                    print(matching_keys)
-                    print(matching_key_set_name)
-                    union_entity_cnt = self._redisClient.sunionstore(matching_key_set_name, matching_keys)
-                    self._redisClient.expire(matching_key_set_name, 60)
-                    if union_entity_cnt > 0:
-                        filter_list.append(matching_key_set_name)
-                    else:
-                        # No matching keys = no result
-                        self.logger.debug('No matching keys:' + key + '=' + value)
-                        return filter_list
-                else:
-                    # No matching keys = no result
-                    self.logger.debug('No entities in matching keys:' + key + '=' + value)
-                    return filter_list
+                filter_list.append(f'{prefix}c:{value}')
+            elif self._is_pattern(value):
+                patterns.append(f'{self._pattern_prefix}i:{key}:{value}')
             else:
-                filter_list.append('i:' + key + ':' + value)
+                filter_list.append(f'{prefix}i:{key}:{value}')
 
-        print('filter list:' + str(filter_list))
-        for entity_uuid in self._redisClient.sinter(filter_list):
-            print('Hit:' + entity_uuid)
-            entity_key = 'e:' + entity_uuid
-            entity: dict = self._redisClient.hgetall(entity_key)
+        if len(filter_list) == 0 and len(patterns) == 0:
+            return
+        self.logger.debug('filter list:%s patterns:%s', filter_list, patterns)
+        # Scans for the patterns, unions, intersection and hydration of the hits run server side in one round-trip
+        result = self._find_script(keys=filter_list, args=[prefix, len(patterns), *patterns, *(fields or [])])
+        for entity_uuid, reply in zip(result[::2], result[1::2]):
+            entity_uuid = entity_uuid.decode()
+            self.logger.debug('Hit:%s', entity_uuid)
+            entity: dict = {key.decode(): value.decode() for key, value in zip(reply[::2], reply[1::2])}
             entity['uuid'] = entity_uuid
             yield entity
 
-    def get_children(self, parent_uuid: str):
-        for child_uuid in self._redisClient.smembers('c:' + parent_uuid):
-            entity: dict = self._redisClient.hgetall('e:' + child_uuid)
-            entity['uuid'] = child_uuid
-            yield entity
+    def get_children(self, parent_uuid: str, fields: Optional[list[str]] = None):
+        # A child can show up twice when the child set changes while it is being read
+        yield from self._get_entities(self._scan_members(f'{self._key_prefix}c:{parent_uuid}'), fields)
+
+    def get_children_page(self, parent_uuid: str, cursor: int = 0, count: int = 100,
+                          fields: Optional[list[str]] = None) -> tuple[int, list[dict[str, str]]]:
+        """Retrieve one page of the children of an entity.
+
+         The child set is paged with SSCAN, so a page holds roughly count children in no particular order. A child
+         that is added or removed while paging may show up twice or not at all.
+
+         Args:
+             parent_uuid: The uuid of the parent entity.
+             cursor: The cursor returned with the previous page, 0 for the first page.
+             count: The approximate number of children per page.
+             fields: The properties to read, all of them when None.
+
+         Returns:
+             The cursor of the next page, 0 when this was the last page, and the children on this page.
+         """
+        cursor, entity_uuids = self._redisClient.sscan(f'{self._key_prefix}c:{parent_uuid}', cursor, count=count)
+        return cursor, list(self._get_entities(entity_uuids, fields))
 
     def get_parent(self, child_uuid: str):
-        parent_uuid = self._redisClient.get('p:' + child_uuid)
-        parent: dict = self._redisClient.hgetall('e:' + parent_uuid)
-        parent['uuid'] = parent_uuid
+        parent_uuid: bytes = self._redisClient.get(f'{self._key_prefix}p:{child_uuid}')
+        parent: dict = _decode(self._redisClient.hgetall(f'{self._key_prefix}e:'.encode() + parent_uuid))
+        parent['uuid'] = parent_uuid.decode()
         return parent
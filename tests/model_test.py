@@ -1,15 +1,22 @@
 import logging
 import unittest
+import uuid
 from hotcore.model import Model
 
 logging.basicConfig(format='%(asctime)s %(levelname)s [%(name)s] %(message)s', level=logging.DEBUG)
 
 class ModelTestCase(unittest.TestCase):
+    def setUp(self):
+        # Each test works in its own key namespace, so the tests neither flush nor see each other's data
+        self.model = Model('localhost', key_prefix=f'test:{uuid.uuid4().hex}:')
+
+    def tearDown(self):
+        # Only removes the keys under the prefix of this test
+        self.model.flush_all()
+
     def test_example(self):
         # Create a department
-        model = Model('localhost')
-        # Clean full dataset
-        model.flush_all()
+        model = self.model
 
         group1: dict[str, str] = model.init({})
         group1['type'] = 'dept'
@@ -50,8 +57,7 @@ class ModelTestCase(unittest.TestCase):
 
 
     def test_operations(self):
-        model = Model('localhost')
-        model.flush_all()
+        model = self.model
         entity: dict = model.init({})
         entity_uuid = entity['uuid']
         entity["key1"] = "value1"
@@ -62,6 +68,21 @@ class ModelTestCase(unittest.TestCase):
         change: dict = {'uuid': entity['uuid'], 'key1': 'change1', 'key2': None, 'key3': 'new3'}
         model.apply(change)
         read_back = model.get(entity_uuid)
+        self.assertEqual({'key1': 'change1', 'key3': 'new3', 'uuid': entity_uuid}, read_back)
+        # The index entries follow the change
+        self.assertEqual(0, len(list(model.find(key1='value1'))))
+        self.assertEqual(0, len(list(model.find(key2='value2'))))
+        self.assertEqual([read_back], list(model.find(key3='new3')))
+        # Removing a property the entity does not have changes nothing
+        model.apply({'uuid': entity_uuid, 'key4': None})
+        self.assertEqual(read_back, model.get(entity_uuid))
+        # Removals and updates in the same change
+        model.apply({'uuid': entity_uuid, 'key1': 'change2', 'key3': None, 'key4': None})
+        read_back = model.get(entity_uuid)
+        self.assertEqual({'key1': 'change2', 'uuid': entity_uuid}, read_back)
+        self.assertEqual(0, len(list(model.find(key1='change1'))))
+        self.assertEqual(0, len(list(model.find(key3='new3'))))
+        self.assertEqual([read_back], list(model.find(key1='change2')))
         print('Get parent:' + str(model.get_parent(entity_uuid)))
         for child in model.get_children('parent1'):
             print('Child:')
@@ -69,6 +90,83 @@ class ModelTestCase(unittest.TestCase):
 
         model.delete(read_back)
 
+    def test_batch_operations(self):
+        model = self.model
+        children = []
+        for child_cnt in range(1, 11):
+            child: dict = model.init({})
+            child['type'] = 'employee'
+            child['name'] = 'child_' + str(child_cnt)
+            children.append(child)
+        model.create_many('parent1', children, chunk_size=4)
+        self.assertEqual(10, len(list(model.get_children('parent1'))))
+        read_back = model.get(children[0]['uuid'])
+        self.assertTrue(children[0] == read_back, "Not matching")
+
+        paged_children = []
+        cursor, page = model.get_children_page('parent1', count=3, fields=['name'])
+        paged_children += page
+        while cursor != 0:
+            cursor, page = model.get_children_page('parent1', cursor, count=3, fields=['name'])
+            paged_children += page
+        self.assertEqual({child['uuid'] for child in children}, {child['uuid'] for child in paged_children})
+
+        model.delete_many(children, chunk_size=4)
+        self.assertEqual(0, len(list(model.get_children('parent1'))))
+        self.assertEqual(0, len(list(model.find(type='employee'))))
+
+    def test_find_fields(self):
+        model = self.model
+        employee1 = model.init({'type': 'employee', 'name': 'Bart', 'zip': '12344'})
+        model.create('parent1', employee1)
+        employee2 = model.init({'type': 'employee', 'name': 'Lisa'})
+        model.create('parent1', employee2)
+
+        hits = list(model.find(type='employee', fields=['name']))
+        self.assertEqual(sorted([{'name': 'Bart', 'uuid': employee1['uuid']},
+                                 {'name': 'Lisa', 'uuid': employee2['uuid']}], key=lambda hit: hit['uuid']),
+                         sorted(hits, key=lambda hit: hit['uuid']))
+        # A requested property the entity lacks is left out
+        hits = list(model.find(type='employee', name='Lisa', fields=['name', 'zip']))
+        self.assertEqual([{'name': 'Lisa', 'uuid': employee2['uuid']}], hits)
+
+    def test_many_properties(self):
+        # More properties than fit in one unpack of the scripts
+        model = self.model
+        entity: dict = model.init({'type': 'wide'})
+        for property_cnt in range(9000):
+            entity['key' + str(property_cnt)] = 'value' + str(property_cnt)
+        model.create('parent1', entity)
+
+        change: dict = {'uuid': entity['uuid']}
+        for property_cnt in range(9000):
+            change['key' + str(property_cnt)] = 'change' + str(property_cnt) if property_cnt < 8000 else None
+        model.apply(change)
+        expected = {key: value for key, value in change.items() if value is not None}
+        expected['type'] = 'wide'
+        self.assertEqual(expected, model.get(entity['uuid']))
+
+        names = ['key' + str(property_cnt) for property_cnt in range(9000)]
+        hits = list(model.find(type='wide', fields=names))
+        self.assertEqual([{key: value for key, value in expected.items() if key != 'type'}], hits)
+
+    def test_find_single_criterion(self):
+        model = self.model
+        group: dict = model.init({'type': 'dept', 'name': 'First Dept'})
+        model.create('root1', group)
+        for name in ('Bart', 'Lisa'):
+            model.create(group['uuid'], model.init({'type': 'employee', 'name': name}))
+
+        self.assertEqual([group], list(model.find(uuid=group['uuid'])))
+        self.assertEqual([], list(model.find(uuid='missing')))
+        self.assertEqual([{'name': 'First Dept', 'uuid': group['uuid']}],
+                         list(model.find(uuid=group['uuid'], fields=['name', 'zip'])))
+
+        children = list(model.find(parent=group['uuid']))
+        self.assertEqual(2, len(children))
+        self.assertEqual(sorted(model.get_children(group['uuid']), key=lambda child: child['uuid']),
+                         sorted(children, key=lambda child: child['uuid']))
+
 
 if __name__ == '__main__':
     unittest.main()
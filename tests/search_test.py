@@ -1,27 +1,50 @@
 import logging
 import time
-from datetime import datetime
 import unittest
+import uuid
 from hotcore.model import Model
+from tests.speed_test import build_children, build_parent
 
 logging.Formatter.converter = time.gmtime
 logging.basicConfig(format='%(asctime)s %(levelname)s [%(name)s] %(message)s', level=logging.DEBUG)
+logger = logging.getLogger(__name__)
 
 
 class ModelTestCase(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # One model is shared by all searches, the data lives in its own key namespace
+        cls.model = Model('localhost', key_prefix=f'test:{uuid.uuid4().hex}:')
+        for parent_cnt in range(1, 25):
+            parent = build_parent(parent_cnt)
+            cls.model.create('parent1', parent)
+            cls.model.create_many(parent['uuid'], build_children())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model.flush_all()
+
     def test_search(self):
-        model = Model('localhost')
-
-        start_time = datetime.now().timestamp()
-        parent = list(model.find(name='parent_23'))[0]
-        # print("Wildcard search:" + str(list(model.find(parent=parent['uuid'], attribute_1='e_8?_attribute_1'))))
-        print('Multiple wildcard search:' + str(list(model.find(parent=parent['uuid'], attribute_1='e_4?_attribute_1', attribute_2='e_4?_attribute_2'))))
-        # print("Fixed value search:" + str(list(model.find(parent=parent['uuid'], attribute_1='e_87_attribute_1'))))
-
-        end_time = datetime.now().timestamp()
-        print('Start:' + str(start_time))
-        print('End  :' + str(end_time))
-        print('Time:' + str((end_time - start_time) / 1.0))
+        model = self.model
+        parents = list(model.find(name='parent_23'))
+        self.assertEqual(1, len(parents))
+        parent_uuid = parents[0]['uuid']
+
+        # The criteria of each search and the number of entities it should find
+        searches = [
+            ({'parent': parent_uuid, 'attribute_1': 'e_4?_attribute_1'}, 10),
+            ({'parent': parent_uuid, 'attribute_1': 'e_4?_attribute_1', 'attribute_2': 'e_4?_attribute_2'}, 10),
+            ({'parent': parent_uuid, 'attribute_1': 'e_37_attribute_1'}, 1),
+            ({'parent': parent_uuid, 'attribute_1': 'e_8?_attribute_1'}, 0),
+            ({'attribute_1': 'p_1?_attribute_1'}, 10),
+        ]
+        for criteria, expected in searches:
+            with self.subTest(criteria=criteria):
+                start_time = time.perf_counter_ns()
+                hits = list(model.find(**criteria))
+                duration = (time.perf_counter_ns() - start_time) / 1e9
+                logger.debug('Search:%s hits:%d time:%f', criteria, len(hits), duration)
+                self.assertEqual(expected, len(hits))
 
 
 if __name__ == '__main__':
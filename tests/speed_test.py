@@ -1,37 +1,64 @@
 import logging
 import time
-from datetime import datetime
 import unittest
+import uuid
 from hotcore.model import Model
 
 logging.basicConfig(format='%(asctime)s %(levelname)s [%(name)s] %(message)s', level=logging.DEBUG)
 
+
+def build_parent(parent_cnt: int) -> dict[str, str]:
+    parent: dict[str, str] = Model.init({})
+    parent['name'] = 'parent_' + str(parent_cnt)
+    for attribute_cnt in range(1, 50):
+        parent["attribute_" + str(attribute_cnt)] = 'p_' + str(parent_cnt) + '_attribute_' + str(attribute_cnt)
+    return parent
+
+
+def build_children() -> list[dict[str, str]]:
+    children = []
+    for child_cnt in range(1, 50):
+        entity: dict[str, str] = Model.init({})
+        entity['name'] = 'entity_' + str(child_cnt)
+        for attribute_cnt in range(1, 50):
+            entity["attribute_" + str(attribute_cnt)] = 'e_' + str(child_cnt) + '_attribute_' + str(attribute_cnt)
+        children.append(entity)
+    return children
+
+
 class ModelTestCase(unittest.TestCase):
+    def setUp(self):
+        # Each test loads into its own key namespace, so tests running alongside keep their data
+        self.model = Model('localhost', key_prefix=f'test:{uuid.uuid4().hex}:')
+
+    def tearDown(self):
+        self.model.flush_all()
+
     def test_load(self):
-        model = Model('localhost')
-        model.flush_all()
+        model = self.model
+
+        start_time = time.perf_counter_ns()
+        for parent_cnt in range(1, 100):
+            parent = build_parent(parent_cnt)
+            model.create('parent1', parent)
+            for entity in build_children():
+                model.create(parent['uuid'], entity)
+
+        duration = (time.perf_counter_ns() - start_time) / 1e9
+        print('Time create:' + str(duration))
+
+    def test_load_many(self):
+        model = self.model
 
-        start_time = datetime.now().timestamp()
+        start_time = time.perf_counter_ns()
         for parent_cnt in range(1, 100):
-            parent: dict[str, str] = model.init({})
-            parent_uuid = parent['uuid']
-            parent['name'] = 'parent_' + str(parent_cnt)
-            for attribute_cnt in range(1, 50):
-                parent["attribute_" + str(attribute_cnt)] = 'p_' + str(parent_cnt) + '_attribute_' + str(attribute_cnt)
+            parent = build_parent(parent_cnt)
             model.create('parent1', parent)
+            # All children of a parent are written in one pipeline
+            model.create_many(parent['uuid'], build_children())
 
-            for child_cnt in range(1, 50):
-                entity: dict[str, str] = model.init({})
-                entity_uuid = entity['uuid']
-                entity['name'] = 'entity_' + str(child_cnt)
-                for attribute_cnt in range(1, 50):
-                    entity["attribute_" + str(attribute_cnt)] = 'e_' + str(child_cnt) + '_attribute_' + str(attribute_cnt)
-                model.create(parent_uuid, entity)
-
-        end_time = datetime.now().timestamp()
-        print('Start:' + str(start_time))
-        print('End  :' + str(end_time))
-        print('Time:' + str((end_time - start_time) / 1.0))
+        duration = (time.perf_counter_ns() - start_time) / 1e9
+        print('Time create_many:' + str(duration))
 
 
 if __name__ == '__main__':